@@ -3,6 +3,9 @@ from tool_agent_demo import Result
 from typing import Optional
 import time
 
+# Marks a missing key, since None is a valid stored value
+_MISSING = object()
+
 
 class DataProcessingAgent(Agent):
     def __init__(self):
@@ -18,9 +21,10 @@ class DataProcessingAgent(Agent):
     @Agent.tool
     def get_data(self, key: str) -> any:
         """Retrieve data for a given key"""
-        if key not in self.data_store:
+        value = self.data_store.get(key, _MISSING)
+        if value is _MISSING:
             raise KeyError(f"No data found for key: {key}")
-        return self.data_store[key]
+        return value
 
     @Agent.tool
     def process_text(self, text: str) -> str:
@@ -36,7 +40,7 @@ class DataProcessingAgent(Agent):
             raise ValueError(f"Value {value} is above maximum {max_val}")
         return value
 
-    @Agent.workflow
+    @Agent.workflow(single=True)
     def process_and_store(self, key: str, text: str) -> Result:
         """Process text and store the result"""
         # Process the text first
@@ -46,7 +50,7 @@ class DataProcessingAgent(Agent):
         # Store the processed result
         return self.store_data(key, processed.unwrap())
 
-    @Agent.workflow
+    @Agent.workflow(single=True)
     def validate_and_store(self, key: str, value: float, min_val: float, max_val: float) -> Result:
         """Validate a number and store if valid"""
         # First validate the number
@@ -56,13 +60,13 @@ class DataProcessingAgent(Agent):
         # Store if validation succeeds
         return self.store_data(key, validated.unwrap())
 
-    @Agent.workflow
+    @Agent.workflow(single=True)
     def chain_operations(self, text: str) -> Result:
         """Demonstrate chaining multiple operations with error handling"""
         # Process text and store with key 'latest'
-        for result in self.process_and_store("latest", text):
-            if result.is_err():
-                return result
+        stored = self.process_and_store("latest", text)
+        if stored.is_err():
+            return stored
 
         # Try to retrieve it back
         retrieved = self.get_data("latest")
@@ -103,24 +107,16 @@ def main():
 
     # Workflow usage
     print("\n=== Workflow Usage ===")
-    for result in agent.process_and_store("workflow_test", "workflow input"):
-        if result.is_err():
-            print(f"Error in workflow: {result.error}")
-            break
-        workflow_result = result
-
-    if 'workflow_result' in locals() and workflow_result.is_ok():
+    workflow_result = agent.process_and_store("workflow_test", "workflow input")
+    if workflow_result.is_ok():
         print(f"Workflow result: {workflow_result.unwrap()}")
+    else:
+        print(f"Error in workflow: {workflow_result.error}")
 
     # Chain operations
     print("\n=== Chained Operations ===")
-    for result in agent.chain_operations("chain test"):
-        if result.is_err():
-            print(f"Error in workflow: {result.error}")
-            break
-        chain_result = result
-
-    if 'chain_result' in locals() and chain_result.is_ok():
+    chain_result = agent.chain_operations("chain test")
+    if chain_result.is_ok():
         print(f"Chain success: {chain_result.unwrap()}")
     else:
         print(f"Chain error: {chain_result.error}")
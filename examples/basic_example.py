@@ -1,3 +1,5 @@
+import math
+
 from tool_agent_demo import Agent
 from tool_agent_demo import Result
 
@@ -23,14 +25,12 @@ class CalculatorAgent(Agent):
     @Agent.workflow
     def calculate_average(self, numbers: list[float]) -> Result:
         """Calculate the average of a list of numbers"""
-        # Add all numbers using reduce
-        total = 0
-        for num in numbers:
-            total = self.add(total, num)
+        # Sum in one pass, fsum also avoids accumulated rounding error
+        total = math.fsum(numbers)
         # Divide by count to get average
         return self.divide(total, len(numbers))
 
-    @Agent.workflow
+    @Agent.workflow(single=True)
     def calculate_compound(self, a: float, b: float) -> Result:
         """Demonstrate chaining operations using the | operator"""
         # First multiply a and b, then add 10 to the result
@@ -62,25 +62,19 @@ def main():
     # Use workflows
     print("\n=== Workflow Usage ===")
     numbers = [1, 2, 3, 4, 5]
-    for result in calc.calculate_average(numbers):
-        if result.is_err():
-            print(f"Error in workflow: {result.error}")
-            break
-        avg_result = result
-
-    if 'avg_result' in locals() and avg_result.is_ok():
+    avg_result = Agent.last_result(calc.calculate_average(numbers))
+    if avg_result.is_ok():
         print(f"Average of {numbers} = {avg_result.unwrap()}")
+    else:
+        print(f"Error in workflow: {avg_result.error}")
 
     # Demonstrate compound operations
     print("\n=== Compound Operations ===")
-    for result in calc.calculate_compound(5, 3):
-        if result.is_err():
-            print(f"Error in workflow: {result.error}")
-            break
-        compound_result = result
-
-    if 'compound_result' in locals() and compound_result.is_ok():
+    compound_result = calc.calculate_compound(5, 3)
+    if compound_result.is_ok():
         print(f"(5 * 3) + 10 = {compound_result.unwrap()}")
+    else:
+        print(f"Error in workflow: {compound_result.error}")
 
     # Print agent information
     print("\n=== Agent Information ===")
@@ -1,39 +1,80 @@
 import asyncio
+import os
 import time
 import random
-import json
 from pathlib import Path
 from typing import List, Dict, Optional
+import orjson
 from tool_agent_demo import Agent, Result
 
+# Product names used by the simulated data sources
+_PRODUCTS = tuple(f"Product {chr(65 + i)}" for i in range(5))
+
 
 class DataAnalysisAgent(Agent):
+    # Seconds a cached fetch result stays fresh
+    CACHE_TTL = 60.0
+
     def __init__(self):
         super().__init__()
         self.cache = {}
+        # Data sources served by fetch_data
+        self._sources = {
+            "sales": self._gen_sales,
+            "inventory": self._gen_inventory
+        }
         self.data_dir = Path("data")
         self.data_dir.mkdir(exist_ok=True)
 
+    def _get_cached(self, key: tuple, ttl: Optional[float] = None) -> Optional[Dict]:
+        """Return a cached value for key, or None if missing or expired"""
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        timestamp, value = entry
+        if ttl is not None and time.monotonic() - timestamp > ttl:
+            del self.cache[key]
+            return None
+        return value
+
+    def _save_cached(self, key: tuple, value: Dict) -> Dict:
+        """Store a value in the cache and return it"""
+        self.cache[key] = (time.monotonic(), value)
+        return value
+
     @Agent.tool
     def fetch_data(self, source_id: str, delay: float = 1.0) -> Dict:
         """Simulate fetching data from an external API with delay"""
-        time.sleep(delay)  # Simulate network delay
-        # Simulate different data sources
-        if source_id == "sales":
-            return {
-                "daily_sales": [random.randint(100, 1000) for _ in range(7)],
-                "total_revenue": random.randint(10000, 50000),
-                "top_products": ["Product A", "Product B", "Product C"]
-            }
-        elif source_id == "inventory":
-            return {
-                "stock_levels": {f"Product {chr(65+i)}": random.randint(0, 100)
-                                 for i in range(5)},
-                "low_stock_alerts": [f"Product {chr(65+i)}"
-                                     for i in range(5) if random.random() < 0.3]
-            }
-        else:
+        cached = self._get_cached(("fetch_data", source_id), self.CACHE_TTL)
+        if cached is not None:
+            return cached
+        return self._save_cached(("fetch_data", source_id),
+                                 self._fetch_data(source_id, delay))
+
+    def _fetch_data(self, source_id: str, delay: float) -> Dict:
+        """Fetch data from the simulated external API"""
+        generate = self._sources.get(source_id)
+        if generate is None:
             raise ValueError(f"Unknown data source: {source_id}")
+        time.sleep(delay)  # Simulate network delay
+        return generate()
+
+    def _gen_sales(self) -> Dict:
+        """Simulated sales data"""
+        return {
+            "daily_sales": [random.randint(100, 1000) for _ in range(7)],
+            "total_revenue": random.randint(10000, 50000),
+            "top_products": list(_PRODUCTS[:3])
+        }
+
+    def _gen_inventory(self) -> Dict:
+        """Simulated inventory data"""
+        return {
+            "stock_levels": {product: random.randint(0, 100)
+                             for product in _PRODUCTS},
+            "low_stock_alerts": [product for product in _PRODUCTS
+                                 if random.random() < 0.3]
+        }
 
     @Agent.tool
     def process_data(self, data: Dict, operation: str) -> Dict:
@@ -66,19 +107,26 @@ class DataAnalysisAgent(Agent):
         """Save processed data to a file (I/O operation)"""
         time.sleep(0.3)  # Simulate I/O delay
         filepath = self.data_dir / filename
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        # Write a sibling temp file and swap it in, so readers never see a
+        # partially written file
+        tmp_path = filepath.with_suffix(filepath.suffix + ".tmp")
+        tmp_path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        os.replace(tmp_path, filepath)
         return str(filepath)
 
     @Agent.tool
     def load_from_file(self, filename: str) -> Dict:
         """Load data from a file (I/O operation)"""
-        time.sleep(0.3)  # Simulate I/O delay
         filepath = self.data_dir / filename
         if not filepath.exists():
             raise FileNotFoundError(f"File not found: {filename}")
-        with open(filepath) as f:
-            return json.load(f)
+        # Key on mtime so rewrites from save_to_file invalidate the entry
+        key = ("load_from_file", filename, filepath.stat().st_mtime_ns)
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached
+        time.sleep(0.3)  # Simulate I/O delay
+        return self._save_cached(key, orjson.loads(filepath.read_bytes()))
 
     @Agent.tool
     def generate_report(self, sales_data: Dict, inventory_data: Dict) -> str:
@@ -86,26 +134,26 @@ class DataAnalysisAgent(Agent):
         time.sleep(1.0)  # Simulate report generation time
 
         # Simulate complex report generation
-        report_lines = [
-            "=== Business Intelligence Report ===\n",
-            "Sales Performance:",
-            f"- Average Daily Sales: ${sales_data['average_sales']:.2f}",
-            f"- Sales Trend: {sales_data['trend']}",
-            f"- Peak Sales Day: Day {sales_data['peak_day'] + 1}",
-            "\nInventory Status:",
-            f"- Low Stock Items: {', '.join(inventory_data['low_stock'])}",
-            f"- Out of Stock Items: {
-                ', '.join(inventory_data['out_of_stock'])}",
-            "\nRecommended Actions:"
-        ]
-
-        for item in inventory_data['reorder_suggestions']:
-            report_lines.append(
-                f"- Order {item['amount']} units of {item['product']}")
-
-        return "\n".join(report_lines)
+        low_stock = ', '.join(inventory_data['low_stock'])
+        out_of_stock = ', '.join(inventory_data['out_of_stock'])
+        actions = "".join(
+            f"\n- Order {item['amount']} units of {item['product']}"
+            for item in inventory_data['reorder_suggestions'])
 
-    @Agent.workflow
+        return f"""=== Business Intelligence Report ===
+
+Sales Performance:
+- Average Daily Sales: ${sales_data['average_sales']:.2f}
+- Sales Trend: {sales_data['trend']}
+- Peak Sales Day: Day {sales_data['peak_day'] + 1}
+
+Inventory Status:
+- Low Stock Items: {low_stock}
+- Out of Stock Items: {out_of_stock}
+
+Recommended Actions:{actions}"""
+
+    @Agent.workflow(single=True)
     def analyze_sales_data(self) -> Result:
         """Workflow to analyze sales data"""
         # Fetch raw sales data
@@ -121,7 +169,7 @@ class DataAnalysisAgent(Agent):
         # Save the results
         return self.save_to_file(analysis.unwrap(), "sales_analysis.json")
 
-    @Agent.workflow
+    @Agent.workflow(single=True)
     def analyze_inventory_data(self) -> Result:
         """Workflow to analyze inventory data"""
         # Fetch raw inventory data
@@ -138,19 +186,21 @@ class DataAnalysisAgent(Agent):
         # Save the results
         return self.save_to_file(analysis.unwrap(), "inventory_analysis.json")
 
+    async def _run_concurrently(self, *workflows) -> List[Result]:
+        """Run independent single result workflows concurrently in worker threads"""
+        return await asyncio.gather(
+            *(asyncio.to_thread(workflow) for workflow in workflows))
+
     @Agent.workflow
     def generate_business_report(self) -> Result:
         """Complex workflow combining multiple data sources and operations"""
-        # Run both analysis workflows
-        for result in self.analyze_sales_data():
-            if result.is_err():
-                return result
-        sales_file = result.unwrap()
-
-        for result in self.analyze_inventory_data():
-            if result.is_err():
-                return result
-        inventory_file = result.unwrap()
+        # Run both analysis workflows concurrently, they share no data
+        sales_result, inventory_result = asyncio.run(self._run_concurrently(
+            self.analyze_sales_data, self.analyze_inventory_data))
+        if sales_result.is_err():
+            return sales_result
+        if inventory_result.is_err():
+            return inventory_result
 
         # Load the analyzed data
         sales_analysis = self.load_from_file("sales_analysis.json")
@@ -198,13 +248,11 @@ def main():
 
     # Track workflow progress
     start_time = time.time()
-    for result in agent.generate_business_report():
-        if result.is_err():
-            print(f"Error in workflow: {result.error}")
-            break
-        final_result = result
+    final_result = Agent.last_result(agent.generate_business_report())
+    if final_result is not None and final_result.is_err():
+        print(f"Error in workflow: {final_result.error}")
 
-    if 'final_result' in locals() and final_result.is_ok():
+    if final_result is not None and final_result.is_ok():
         print(f"\nWorkflow completed in {
               time.time() - start_time:.2f} seconds")
         # Load and display the report
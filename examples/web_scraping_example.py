@@ -1,79 +1,224 @@
+import asyncio
+import os
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 import json
+import re
+import hashlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
+import orjson
 from bs4 import BeautifulSoup
 from tool_agent_demo import Agent, Result
 
+try:
+    from lxml import etree
+    # libxml2 backed parser, much faster than the pure Python one
+    PARSER = 'lxml'
+    _HTML_PARSER = etree.HTMLParser()
+    _XPATH_HREFS = etree.XPath('//a/@href')
+except ImportError:
+    PARSER = 'html.parser'
+
+# Two or more spaces between phrases of extracted text
+_PHRASE_GAP = re.compile(r' {2,}')
+
+# Set AGENT_SIMULATE_LATENCY to add artificial processing delays
+SIMULATE_LATENCY = bool(os.environ.get("AGENT_SIMULATE_LATENCY"))
+
+
+def _simulate_latency(seconds: float) -> None:
+    """Sleep only when simulated latency is enabled"""
+    if SIMULATE_LATENCY:
+        time.sleep(seconds)
+
+
+def _hrefs(html: Union[str, bytes]) -> List[str]:
+    """All href values of <a> tags in an HTML document"""
+    if PARSER == 'lxml':
+        try:
+            # Query the libxml2 tree directly, no soup objects per node
+            doc = etree.fromstring(html, _HTML_PARSER)
+            return [str(href) for href in _XPATH_HREFS(doc)] if doc is not None else []
+        except ValueError:
+            # lxml rejects str input that carries an encoding declaration
+            pass
+    soup = BeautifulSoup(html, PARSER)
+    return [a['href'] for a in soup.find_all('a', href=True)]
+
+
+def _analyze_text(text: str) -> Dict:
+    """Word statistics of a text, picklable for worker processes"""
+    words = text.split()
+    word_count = len(words)
+    return {
+        "word_count": word_count,
+        "avg_word_length": sum(map(len, words)) / word_count if word_count else 0.0,
+        "paragraph_count": text.count('\n\n') + 1
+    }
+
 
 class WebScrapingAgent(Agent):
+    # Pages kept in memory on top of the disk cache
+    MEMORY_CACHE_SIZE = 256
+    # Texts at least this long are analyzed in a worker process
+    POOL_MIN_CHARS = 100_000
+
     def __init__(self):
         super().__init__()
         self.cache_dir = Path("cache")
         self.cache_dir.mkdir(exist_ok=True)
-        self.session = None
+        # LRU of recently fetched pages, shared by concurrent workflows
+        self._mem_cache: OrderedDict[str, bytes] = OrderedDict()
+        self._mem_lock = threading.Lock()
+        # Process pool for CPU-bound text analysis, created on first use
+        self._cpu_pool: Optional[ProcessPoolExecutor] = None
+        self._cpu_pool_lock = threading.Lock()
+        # Shared session so repeated fetches reuse pooled keep-alive connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20,
+                              max_retries=Retry(total=3, backoff_factor=0.2))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     @Agent.tool
-    def fetch_page(self, url: str, cache: bool = True) -> str:
-        """Fetch a web page with caching support"""
+    def fetch_page(self, url: str, cache: bool = True) -> bytes:
+        """Fetch a web page's raw bytes with caching support"""
         if cache:
-            cache_file = self.cache_dir / f"{hash(url)}.html"
+            content = self._recall(url)
+            if content is not None:
+                return content
+            cache_file = self._cache_file(url)
             if cache_file.exists():
-                return cache_file.read_text()
+                return self._remember(url, cache_file.read_bytes())
 
-        response = requests.get(url)
-        content = response.text
+        response = self.session.get(url, timeout=(3.05, 27))
+        response.raise_for_status()
+        # Keep the raw bytes, the parsers decode using the page's own charset
+        content = response.content
         if cache:
-            cache_file.write_text(content)
+            cache_file.write_bytes(content)
+            self._remember(url, content)
+        return content
+
+    def _cache_file(self, url: str) -> Path:
+        """Cache location of a fetched page, stable across runs"""
+        digest = hashlib.blake2b(url.encode(), digest_size=8).hexdigest()
+        return self.cache_dir / f"{digest}.html"
+
+    def _recall(self, url: str) -> Optional[bytes]:
+        """Return a page from the in-memory cache, or None"""
+        with self._mem_lock:
+            content = self._mem_cache.get(url)
+            if content is not None:
+                self._mem_cache.move_to_end(url)
+            return content
+
+    def _remember(self, url: str, content: bytes) -> bytes:
+        """Add a page to the in-memory cache, evicting the oldest entry"""
+        with self._mem_lock:
+            self._mem_cache[url] = content
+            self._mem_cache.move_to_end(url)
+            if len(self._mem_cache) > self.MEMORY_CACHE_SIZE:
+                self._mem_cache.popitem(last=False)
         return content
 
+    async def _fetch_many(self, urls: List[str]) -> List:
+        """Fetch pages concurrently, returning bytes or the exception per URL"""
+        connector = aiohttp.TCPConnector(
+            limit=20, limit_per_host=8, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(sock_connect=3.05, sock_read=27)
+        async with aiohttp.ClientSession(connector=connector,
+                                         timeout=timeout) as session:
+            async def fetch(url: str) -> bytes:
+                content = self._recall(url)
+                if content is not None:
+                    return content
+                cache_file = self._cache_file(url)
+                if cache_file.exists():
+                    return self._remember(url, cache_file.read_bytes())
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    content = await response.read()
+                cache_file.write_bytes(content)
+                return self._remember(url, content)
+
+            return await asyncio.gather(*(fetch(url) for url in urls),
+                                        return_exceptions=True)
+
     @Agent.tool
-    def extract_links(self, html: str, base_url: str) -> List[str]:
+    def extract_links(self, html: Union[str, bytes], base_url: str) -> List[str]:
         """Extract all links from HTML content"""
-        time.sleep(0.2)  # Simulate processing time
-        soup = BeautifulSoup(html, 'html.parser')
+        _simulate_latency(0.2)  # Simulate processing time
+        base = base_url.rstrip('/')
         links = []
-        for a in soup.find_all('a', href=True):
-            href = a['href']
+        for href in _hrefs(html):
             if href.startswith('http'):
                 links.append(href)
             elif href.startswith('/'):
-                links.append(f"{base_url.rstrip('/')}{href}")
+                links.append(f"{base}{href}")
         return links
 
     @Agent.tool
-    def extract_text(self, html: str) -> str:
+    def extract_text(self, html: Union[str, bytes]) -> str:
         """Extract main text content from HTML"""
-        time.sleep(0.3)  # Simulate processing time
-        soup = BeautifulSoup(html, 'html.parser')
+        _simulate_latency(0.3)  # Simulate processing time
+        soup = BeautifulSoup(html, PARSER)
         # Remove script and style elements
         for script in soup(["script", "style"]):
             script.decompose()
         # Get text and clean it up
         text = soup.get_text()
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip()
-                  for line in lines for phrase in line.split("  "))
-        return '\n'.join(chunk for chunk in chunks if chunk)
+        # Runs of spaces separate phrases, put each phrase on its own line
+        lines = (line.strip()
+                 for line in _PHRASE_GAP.sub('\n', text).splitlines())
+        return '\n'.join(filter(None, lines))
 
     @Agent.tool
     def analyze_text(self, text: str) -> Dict:
         """Analyze text content"""
-        time.sleep(0.5)  # Simulate analysis time
-        words = text.split()
-        return {
-            "word_count": len(words),
-            "avg_word_length": sum(len(word) for word in words) / len(words),
-            "paragraph_count": text.count('\n\n') + 1
-        }
+        _simulate_latency(0.5)  # Simulate analysis time
+        return _analyze_text(text)
+
+    @Agent.tool
+    def analyze_texts(self, texts: List[str]) -> List[Dict]:
+        """Analyze several texts, large ones in parallel worker processes"""
+        _simulate_latency(0.5)  # Simulate analysis time
+        futures = [self._get_cpu_pool().submit(_analyze_text, text)
+                   if len(text) >= self.POOL_MIN_CHARS else None
+                   for text in texts]
+        return [future.result() if future is not None else _analyze_text(text)
+                for future, text in zip(futures, texts)]
+
+    def _get_cpu_pool(self) -> ProcessPoolExecutor:
+        """Return the text analysis process pool, creating it if needed"""
+        with self._cpu_pool_lock:
+            if self._cpu_pool is None:
+                # Spawned, since workflows may be running in other threads
+                self._cpu_pool = ProcessPoolExecutor(
+                    max_workers=os.cpu_count(),
+                    mp_context=multiprocessing.get_context("spawn"))
+            return self._cpu_pool
+
+    def close(self) -> None:
+        """Release the HTTP session and the analysis process pool"""
+        self.session.close()
+        if self._cpu_pool is not None:
+            self._cpu_pool.shutdown()
+            self._cpu_pool = None
 
     @Agent.tool
     def save_results(self, data: Dict, filename: str) -> str:
         """Save analysis results to file"""
         filepath = self.cache_dir / filename
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        filepath.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
         return str(filepath)
 
     @Agent.workflow
@@ -106,72 +251,70 @@ class WebScrapingAgent(Agent):
             return analysis
 
         # Add main page results
+        page_analysis = analysis.unwrap()
+        main_links = links.unwrap()
         results["pages"].append({
             "url": url,
-            "analysis": analysis.unwrap()
+            "analysis": page_analysis
         })
-        results["total_words"] += analysis.unwrap()["word_count"]
-        results["total_links"] += len(links.unwrap())
-
-        # Analyze linked pages (up to max_pages)
-        for link in links.unwrap()[:max_pages-1]:
-            # Fetch and analyze linked page
-            page = self.fetch_page(link)
-            if page.is_err():
+        results["total_words"] += page_analysis["word_count"]
+        results["total_links"] += len(main_links)
+        avg_length_sum = page_analysis["avg_word_length"]
+
+        # Fetch linked pages (up to max_pages) concurrently
+        linked_urls = main_links[:max_pages-1]
+        pages = asyncio.run(self._fetch_many(linked_urls))
+        page_texts = []
+        for link, page in zip(linked_urls, pages):
+            if isinstance(page, Exception):
                 continue
 
-            text = self.extract_text(page.unwrap())
+            text = self.extract_text(page)
             if text.is_err():
                 continue
-
-            analysis = self.analyze_text(text.unwrap())
-            if analysis.is_err():
-                continue
-
-            # Add page results
-            results["pages"].append({
-                "url": link,
-                "analysis": analysis.unwrap()
-            })
-            results["total_words"] += analysis.unwrap()["word_count"]
+            page_texts.append((link, text.unwrap()))
 
             # Extract and count links
-            page_links = self.extract_links(page.unwrap(), link)
+            page_links = self.extract_links(page, link)
             if page_links.is_ok():
                 results["total_links"] += len(page_links.unwrap())
 
-        # Calculate average word length across all pages
-        total_pages = len(results["pages"])
-        if total_pages > 0:
-            avg_lengths = [page["analysis"]["avg_word_length"]
-                           for page in results["pages"]]
-            results["avg_word_length"] = sum(avg_lengths) / total_pages
+        # Analyze all linked pages together, large pages in parallel
+        analyses = self.analyze_texts([text for _, text in page_texts])
+        if analyses.is_ok():
+            for (link, _), page_analysis in zip(page_texts, analyses.unwrap()):
+                # Add page results
+                results["pages"].append({
+                    "url": link,
+                    "analysis": page_analysis
+                })
+                results["total_words"] += page_analysis["word_count"]
+                avg_length_sum += page_analysis["avg_word_length"]
+
+        # Average word length across all pages, from the running sum
+        results["avg_word_length"] = avg_length_sum / len(results["pages"])
 
         # Save final results
         return self.save_results(results, "website_analysis.json")
 
+    async def _analyze_sites(self, urls: List[str], max_pages: int) -> List[Optional[Result]]:
+        """Drain analyze_website for every URL in worker threads"""
+        return await asyncio.gather(*(
+            asyncio.to_thread(Agent.last_result,
+                              self.analyze_website(url, max_pages=max_pages))
+            for url in urls))
+
     @Agent.workflow
     def parallel_site_analysis(self, urls: List[str]) -> Result:
         """Analyze multiple websites in parallel"""
+        # Run the per-site workflows concurrently
+        completed = asyncio.run(self._analyze_sites(urls, max_pages=2))
         results = {}
-
-        # Create tasks for each URL
-        tasks = []
-        for url in urls:
-            for result in self.analyze_website(url, max_pages=2):
-                if result.is_err():
-                    results[url] = {"error": str(result.error)}
-                else:
-                    tasks.append(result)
-
-        # Wait for all tasks to complete
-        if tasks:
-            completed = [task.unwrap() for task in tasks]
-            for url, result in zip(urls, completed):
-                if isinstance(result, Exception):
-                    results[url] = {"error": str(result)}
-                else:
-                    results[url] = result
+        for url, result in zip(urls, completed):
+            if result is None or result.is_err():
+                results[url] = {"error": str(result.error if result else "no result")}
+            else:
+                results[url] = result.unwrap()
 
         # Save combined results
         return self.save_results(results, "parallel_analysis.json")
@@ -186,13 +329,12 @@ def main():
 
     # Analyze a single website
     start_time = time.time()
-    for result in agent.analyze_website("http://example.com"):
-        if result.is_err():
-            print(f"Error: {result.error}")
-            break
-        final_result = result
+    final_result = Agent.last_result(
+        agent.analyze_website("http://example.com"))
+    if final_result is not None and final_result.is_err():
+        print(f"Error: {final_result.error}")
 
-    if 'final_result' in locals() and final_result.is_ok():
+    if final_result is not None and final_result.is_ok():
         print(f"Analysis completed in {time.time() - start_time:.2f} seconds")
         with open(final_result.unwrap()) as f:
             analysis = json.load(f)
@@ -211,13 +353,11 @@ def main():
     print(f"\nAnalyzing {len(urls)} websites in parallel...")
 
     start_time = time.time()
-    for result in agent.parallel_site_analysis(urls):
-        if result.is_err():
-            print(f"Error: {result.error}")
-            break
-        final_result = result
+    final_result = Agent.last_result(agent.parallel_site_analysis(urls))
+    if final_result is not None and final_result.is_err():
+        print(f"Error: {final_result.error}")
 
-    if 'final_result' in locals() and final_result.is_ok():
+    if final_result is not None and final_result.is_ok():
         print(f"Parallel analysis completed in {
               time.time() - start_time:.2f} seconds")
         with open(final_result.unwrap()) as f:
@@ -231,8 +371,7 @@ def main():
                     print(f"Analysis saved to: {data}")
 
     # Cleanup
-    if agent.session:
-        agent.session.close()
+    agent.close()
 
 
 if __name__ == "__main__":
@@ -1,15 +1,154 @@
-import json
+import asyncio
 import os
-import queue
 import random
 import string
+import tempfile
+import time
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
 
+import orjson
 from fastapi import HTTPException
-from jupyter_client import KernelManager
+from jupyter_client import AsyncKernelManager
+
+from tool_agent_demo.core.db import get_executor, list_executors
+
+# Most kernels to keep running at once
+MAX_KERNELS = int(os.environ.get('TOOL_AGENT_MAX_KERNELS', '8'))
+# Seconds a cached executor row is trusted. Agents are registered from
+# the CLI, in another process, so the cache cannot be told to drop them.
+METADATA_TTL = float(os.environ.get('TOOL_AGENT_METADATA_TTL', '5'))
+# Encoded arguments and outputs larger than SPILL_BYTES are passed through
+# a file in SPILL_DIR (shared memory where available) instead of the kernel
+# messages. Kernels always run on this machine, so both sides can reach it.
+SPILL_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SPILL_BYTES = 64 * 1024
+
+# Helpers defined once in every kernel. Each execute() then sends a short
+# _agent_run / _agent_next call instead of a full script.
+_KERNEL_BOOTSTRAP = f"""
+_SPILL_DIR = {SPILL_DIR!r}
+_SPILL_BYTES = {SPILL_BYTES!r}
+""" + """
+import importlib.util
+import os
+import tempfile
+from pathlib import Path
+
+import orjson
+
+from tool_agent_demo.core.result import Result
+
+# Step by step workflow iterators, by kernel id
+_agent_runs = {}
+# Loaded agents, by (module_path, var_name), with the module's mtime
+_agents = {}
+
+
+def _agent_load(module_path, var_name):
+    path = Path(module_path + '.py')
+    key = (module_path, var_name)
+    mtime = path.stat().st_mtime_ns
+    cached = _agents.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    spec = importlib.util.spec_from_file_location(path.stem, str(path))
+    if not spec or not spec.loader:
+        raise ImportError(f'Cannot load module from {path}')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    agent = getattr(module, var_name)()
+    _agents[key] = (mtime, agent)
+    return agent
 
-from tool_agent_demo.core.db import get_executor
+
+def _agent_emit(output):
+    encoded = orjson.dumps(output, option=orjson.OPT_NON_STR_KEYS)
+    if len(encoded) > _SPILL_BYTES:
+        fd, path = tempfile.mkstemp(
+            prefix='agent-out-', suffix='.json', dir=_SPILL_DIR)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(encoded)
+        encoded = orjson.dumps({'output_file': path})
+    print(encoded.decode())
+
+
+def _agent_step(kernel_id, result):
+    # A Result ends the run, any other value is an intermediate step
+    if isinstance(result, Result):
+        _agent_runs.pop(kernel_id, None)
+        if result.is_err():
+            return {'error': str(result.error)}
+        return {'result': result.unwrap(), 'kernel_id': None}
+    return {'result': result, 'kernel_id': kernel_id}
+
+
+def _agent_run(module_path, var_name, method_type, method_name,
+               call, step_by_step, kernel_id):
+    try:
+        agent = _agent_load(module_path, var_name)
+        method = getattr(agent, '_' + method_type)[method_name]
+        # call is the encoded [args, kwargs], or the path of a file holding it
+        if isinstance(call, str):
+            call = Path(call).read_bytes()
+        args, kwargs = orjson.loads(call)
+
+        if method_type == 'workflows':
+            steps = method(*args, **kwargs)
+            if isinstance(steps, Result):
+                # Single result workflows are already drained
+                steps = iter([steps])
+
+            if step_by_step:
+                _agent_runs[kernel_id] = steps
+                output = _agent_step(kernel_id, next(steps))
+            else:
+                # Execute to completion
+                final_result = None
+                results = []
+                for result in steps:
+                    if isinstance(result, Result):
+                        final_result = result
+                        if result.is_err():
+                            break
+                    else:
+                        results.append(result)
+
+                if final_result is None:
+                    output = {'results': results}
+                elif final_result.is_err():
+                    output = {'error': str(final_result.error)}
+                else:
+                    output = {'result': final_result.unwrap()}
+        else:
+            # For tools, get single result
+            result = method(*args, **kwargs)
+            if not isinstance(result, Result):
+                output = {'result': result}
+            elif result.is_err():
+                output = {'error': str(result.error)}
+            else:
+                output = {'result': result.unwrap()}
+        _agent_emit(output)
+    except Exception as e:
+        _agent_runs.pop(kernel_id, None)
+        _agent_emit({'error': str(e)})
+
+
+def _agent_next(kernel_id):
+    try:
+        result = next(_agent_runs[kernel_id], None)
+        if result is None:
+            _agent_runs.pop(kernel_id, None)
+            output = {'result': None, 'kernel_id': None}
+        else:
+            output = _agent_step(kernel_id, result)
+        _agent_emit(output)
+    except Exception as e:
+        _agent_runs.pop(kernel_id, None)
+        _agent_emit({'error': str(e)})
+"""
 
 
 class AsyncExecutor:
@@ -25,45 +164,72 @@ class AsyncExecutor:
         self.active_kernels: Dict[str, Tuple[str,
                                              str, str, List[Any], Dict[str, Any]]] = {}
         self._kernel_counter = 0
+        # Serializes kernel startup between concurrent first requests
+        self._init_lock = asyncio.Lock()
+        # The kernel runs one request at a time, and each request reads
+        # its own replies off the shared channels
+        self._execute_lock = asyncio.Lock()
+        # Interpreter path, set once it has been found to exist
+        self._python_path: Optional[str] = None
 
     async def _init_kernel(self):
         """Initialize Jupyter kernel if not already running"""
         if self.initialized:
             return
 
-        # Get Python interpreter path from executor_path
-        python_path = str(Path(self.executor_path) / "bin" / "python")
+        async with self._init_lock:
+            if self.initialized:
+                return
 
-        # Verify Python interpreter exists
-        if not os.path.exists(python_path):
-            raise HTTPException(
-                status_code=500,
-                detail=f"Python interpreter not found at {python_path}"
-            )
+            if self._python_path is None:
+                # Get Python interpreter path from executor_path
+                python_path = str(Path(self.executor_path) / "bin" / "python")
 
-        # Configure kernel command
-        kernel_cmd = [python_path, "-m",
-                      "ipykernel_launcher", "-f", "{connection_file}"]
-
-        try:
-            # Start kernel with custom Python interpreter
-            self.km = KernelManager()
-            self.km.kernel_cmd = kernel_cmd
-            self.km.start_kernel()
-
-            # Get client and start channels
-            self.kc = self.km.client()
-            self.kc.start_channels()
-
-            # Wait for kernel to be ready
-            self.kc.wait_for_ready(timeout=30)
-            self.initialized = True
-        except Exception as e:
-            await self._cleanup()
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to initialize kernel: {str(e)}"
-            )
+                # Verify Python interpreter exists
+                if not os.path.exists(python_path):
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"Python interpreter not found at {python_path}"
+                    )
+                self._python_path = python_path
+
+            # Configure kernel command
+            kernel_cmd = [self._python_path, "-m",
+                          "ipykernel_launcher", "-f", "{connection_file}"]
+
+            try:
+                # Start kernel with custom Python interpreter
+                self.km = AsyncKernelManager()
+                self.km.kernel_cmd = kernel_cmd
+                await self.km.start_kernel()
+
+                # Get client and start channels
+                self.kc = self.km.client()
+                self.kc.start_channels()
+
+                # Wait for kernel to be ready
+                await self.kc.wait_for_ready(timeout=30)
+
+                # Define the dispatch helpers once for this kernel
+                msg_id = self.kc.execute(_KERNEL_BOOTSTRAP, silent=True)
+                reply = await self._get_reply(msg_id, timeout=30)
+                if reply['content']['status'] != 'ok':
+                    raise RuntimeError(
+                        f"Kernel bootstrap failed: {reply['content'].get('evalue')}")
+                self.initialized = True
+            except Exception as e:
+                await self._cleanup()
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Failed to initialize kernel: {str(e)}"
+                )
+
+    async def _get_reply(self, msg_id: str, timeout: float) -> Dict[str, Any]:
+        """Get the shell reply to a request, skipping replies to earlier ones"""
+        while True:
+            reply = await self.kc.get_shell_msg(timeout=timeout)
+            if reply['parent_header'].get('msg_id') == msg_id:
+                return reply
 
     async def _cleanup(self, kernel_id: Optional[str] = None):
         """Cleanup kernel"""
@@ -76,7 +242,7 @@ class AsyncExecutor:
             if self.kc:
                 self.kc.stop_channels()
             if self.km:
-                self.km.shutdown_kernel()
+                await self.km.shutdown_kernel()
                 self.km = None
                 self.kc = None
                 self.initialized = False
@@ -86,6 +252,10 @@ class AsyncExecutor:
         """Cancel a specific kernel execution"""
         if kernel_id in self.active_kernels:
             await self._cleanup(kernel_id)
+            if self.kc:
+                # Drop the workflow iterator held by the kernel
+                self.kc.execute(
+                    f"_agent_runs.pop({kernel_id!r}, None)", silent=True)
             return True
         return False
 
@@ -103,6 +273,9 @@ class AsyncExecutor:
                     detail="Kernel client not initialized"
                 )
 
+            # File holding large call arguments, if any
+            spill_path = None
+
             # If kernel_id is provided, validate it exists
             if kernel_id and kernel_id not in self.active_kernels:
                 raise HTTPException(
@@ -122,124 +295,41 @@ class AsyncExecutor:
                     )
 
                 # Execute next step
-                script = """
-result = next(workflow_iterator, None)
-if result is None:
-    print(json.dumps({'result': final_result.unwrap() if final_result else None, 'kernel_id': None}))
-else:
-    if isinstance(result, Result):
-        if result.is_err():
-            print(json.dumps({'error': str(result.error)}))
-            sys.exit(0)
-        final_result = result
-        if final_result.is_ok():
-            print(json.dumps({'result': final_result.unwrap(), 'kernel_id': None}))
-        else:
-            print(json.dumps({'result': result, 'kernel_id': current_kernel_id}))
-    else:
-        print(json.dumps({'result': result, 'kernel_id': current_kernel_id}))
-"""
-            else:
-                # Prepare new execution code
-                script = f"""
-import json
-import sys
-import importlib.util
-from pathlib import Path
-
-# Import module
-module_path = Path('{module_path}.py')
-spec = importlib.util.spec_from_file_location(
-    module_path.stem, str(module_path))
-if not spec or not spec.loader:
-    sys.exit(1)
-
-module = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(module)
-
-# Get agent class and create instance
-agent_class = getattr(module, '{var_name}')
-agent = agent_class()
-
-# Get method
-method = getattr(agent, '_{method_type}')['{method_name}']
-
-# Execute
-try:
-    # Import Result type
-    from tool_agent_demo.core.result import Result
-
-    # Parse arguments
-    args = json.loads('''{json.dumps(args)}''')
-    kwargs = json.loads('''{json.dumps(kwargs)}''')
-
-    if '{method_type}' == 'workflows':
-        # For workflows, handle step by step execution
-        current_kernel_id = '{kernel_id if kernel_id else f"k{self._kernel_counter:02d}" + "".join(random.choices(string.ascii_lowercase, k=3))}'
-        workflow_iterator = method(*args, **kwargs)
-        final_result = None
-
-        if {step_by_step}:
-            # Get first result for step by step
-            result = next(workflow_iterator)
-            if isinstance(result, Result):
-                if result.is_err():
-                    print(json.dumps({{'error': str(result.error)}}))
-                    sys.exit(0)
-                final_result = result
-                if final_result.is_ok():
-                    print(json.dumps(
-                        {{'result': final_result.unwrap(), 'kernel_id': None}}))
-                else:
-                    print(json.dumps(
-                        {{'result': result, 'kernel_id': current_kernel_id}}))
+                script = f"_agent_next({kernel_id!r})"
             else:
-                print(json.dumps(
-                    {{'result': result, 'kernel_id': current_kernel_id}}))
-        else:
-            # Execute to completion
-            results = []
-            for result in workflow_iterator:
-                if isinstance(result, Result):
-                    if result.is_err():
-                        print(json.dumps({{'error': str(result.error)}}))
-                        sys.exit(0)
-                    final_result = result
-                else:
-                    results.append(result)
+                # Dispatch to the helpers defined when the kernel started.
+                # Arguments travel as a bytes literal, never as source text.
+                new_kernel_id = f"k{self._kernel_counter:02d}" + \
+                    "".join(random.choices(string.ascii_lowercase, k=3))
+                call = orjson.dumps([args, kwargs])
+                if len(call) > SPILL_BYTES:
+                    fd, spill_path = tempfile.mkstemp(
+                        prefix="agent-in-", suffix=".json", dir=SPILL_DIR)
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(call)
+                    call = spill_path
+                script = (
+                    f"_agent_run({module_path!r}, {var_name!r}, "
+                    f"{method_type!r}, {method_name!r}, {call!r}, "
+                    f"{step_by_step!r}, {new_kernel_id!r})"
+                )
 
-            if final_result is not None:
-                print(json.dumps({{'result': final_result.unwrap()}}))
-            else:
-                print(json.dumps({{'results': results}}))
-    else:
-        # For tools, get single result
-        result = method(*args, **kwargs)
-        if isinstance(result, Result):
-            if result.is_err():
-                print(json.dumps({{'error': str(result.error)}}))
-                sys.exit(0)  # Use 0 to indicate expected error
-            print(json.dumps({{'result': result.unwrap()}}))
-        else:
-            print(json.dumps({{'result': result}}))
-except Exception as e:
-    print(json.dumps({{'error': str(e)}}))
-    sys.exit(1)  # Use 1 to indicate unexpected error
-"""
             try:
-                # Execute code
-                msg_id = self.kc.execute(script)
-
-                # Get output first
-                output = None
-                while True:
-                    try:
-                        msg = self.kc.get_iopub_msg(timeout=0.1)
+                async with self._execute_lock:
+                    # Execute code
+                    msg_id = self.kc.execute(script)
+
+                    # Get output first, awaiting messages as they arrive
+                    while True:
+                        msg = await self.kc.get_iopub_msg()
+                        if msg['parent_header'].get('msg_id') != msg_id:
+                            # Output of an earlier request
+                            continue
                         if msg['msg_type'] == 'stream':
                             try:
-                                output = json.loads(msg['content']['text'])
+                                output = orjson.loads(msg['content']['text'])
                                 break
-                            except json.JSONDecodeError:
+                            except orjson.JSONDecodeError:
                                 continue
                         elif msg['msg_type'] == 'error':
                             await self._cleanup()
@@ -248,13 +338,16 @@ except Exception as e:
                                 detail=f"Error in output: {
                                     msg['content']['evalue']}"
                             )
-                    except queue.Empty:
-                        if output is not None:
-                            break
-                        continue
 
-                # Get execution result
-                reply = self.kc.get_shell_msg(timeout=30)
+                    # Get execution result
+                    reply = await self._get_reply(msg_id, timeout=30)
+
+                if 'output_file' in output:
+                    # Large outputs are handed over through a file
+                    output_path = Path(output['output_file'])
+                    output = orjson.loads(output_path.read_bytes())
+                    output_path.unlink()
+
                 if reply['content']['status'] == 'error':
                     # If we have output, it might be an expected error
                     if output and 'error' in output:
@@ -269,7 +362,7 @@ except Exception as e:
                     )
 
                 # Store kernel info if step by step execution
-                if step_by_step and not kernel_id and 'kernel_id' in output:
+                if step_by_step and not kernel_id and output.get('kernel_id'):
                     self.active_kernels[output['kernel_id']] = (
                         module_path, var_name, method_name, args, kwargs
                     )
@@ -289,6 +382,9 @@ except Exception as e:
                     status_code=500,
                     detail=f"Execution failed: {str(e)}"
                 )
+            finally:
+                if spill_path:
+                    Path(spill_path).unlink(missing_ok=True)
         else:
             raise HTTPException(
                 status_code=400,
@@ -298,7 +394,53 @@ except Exception as e:
     def __del__(self):
         """Cleanup when object is destroyed"""
         if self.km:
-            self.km.shutdown_kernel(now=True)
+            shutdown = self.km.shutdown_kernel(now=True)
+            try:
+                asyncio.get_running_loop().create_task(shutdown)
+            except RuntimeError:
+                # No running event loop in this thread
+                asyncio.run(shutdown)
+
+
+class ExecutorMetadata(NamedTuple):
+    """Registered executor fields needed to serve a call"""
+    executor_type: str
+    executor_path: str
+    entrypoint_path: str
+    variable_name: str
+    tool_names: frozenset
+    workflow_names: frozenset
+
+
+# executor_id -> (time loaded, metadata)
+_metadata_cache: Dict[str, Tuple[float, ExecutorMetadata]] = {}
+
+
+def get_executor_metadata(executor_id: str) -> Optional[ExecutorMetadata]:
+    """Get an executor's metadata, from the database at most once per METADATA_TTL"""
+    now = time.monotonic()
+    cached = _metadata_cache.get(executor_id)
+    if cached and now - cached[0] < METADATA_TTL:
+        return cached[1]
+
+    executor = get_executor(executor_id)
+    if not executor:
+        # Unknown ids are not cached, so they cannot grow the cache
+        _metadata_cache.pop(executor_id, None)
+        return None
+
+    metadata = ExecutorMetadata(
+        executor_type=executor.executor_type,
+        executor_path=executor.executor_path,
+        entrypoint_path=executor.entrypoint_path,
+        variable_name=executor.variable_name,
+        tool_names=frozenset(
+            t["name"] for t in executor.agent_info.get("tools", [])),
+        workflow_names=frozenset(
+            w["name"] for w in executor.agent_info.get("workflows", []))
+    )
+    _metadata_cache[executor_id] = (now, metadata)
+    return metadata
 
 
 # Store loaded executors
@@ -310,7 +452,7 @@ def get_executor_wrapper(executor_id: str) -> AsyncExecutor:
     if executor_id in executors:
         return executors[executor_id]
 
-    executor = get_executor(executor_id)
+    executor = get_executor_metadata(executor_id)
     if not executor:
         raise HTTPException(
             status_code=404,
@@ -320,3 +462,29 @@ def get_executor_wrapper(executor_id: str) -> AsyncExecutor:
     wrapper = AsyncExecutor(executor.executor_type, executor.executor_path)
     executors[executor_id] = wrapper
     return wrapper
+
+
+async def warm_up_executors() -> None:
+    """Start kernels for the most recently updated agents ahead of their first call"""
+    recent = sorted(
+        (e for e in list_executors() if e.executor_type == "env"),
+        key=lambda e: e.updated_at, reverse=True
+    )[:MAX_KERNELS]
+    for executor in recent:
+        if executor.id not in executors:
+            executors[executor.id] = AsyncExecutor(
+                executor.executor_type, executor.executor_path)
+
+    # A broken environment only costs its own agent a cold start
+    await asyncio.gather(
+        *(executors[executor.id]._init_kernel() for executor in recent),
+        return_exceptions=True
+    )
+
+
+async def shutdown_executors() -> None:
+    """Shut down the kernels of all loaded executors"""
+    await asyncio.gather(
+        *(executor._cleanup() for executor in executors.values()),
+        return_exceptions=True
+    )
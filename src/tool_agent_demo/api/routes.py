@@ -1,14 +1,36 @@
-from typing import List, Dict, Any
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Iterator
 
+import orjson
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from tool_agent_demo.core.db import list_executors, get_executor
+from tool_agent_demo.core.db import iter_executors
 from tool_agent_demo.api.models import AgentInfo, ToolRequest, WorkflowRequest
-from tool_agent_demo.api.executor import get_executor_wrapper, executors
+from tool_agent_demo.api.executor import (
+    get_executor_wrapper, get_executor_metadata, executors,
+    warm_up_executors, shutdown_executors)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start agent kernels with the server and stop them with it"""
+    await warm_up_executors()
+    yield
+    await shutdown_executors()
 
 
 # Create FastAPI app
-app = FastAPI(title="Tool Agent Demo API")
+app = FastAPI(title="Tool Agent Demo API",
+              default_response_class=ORJSONResponse,
+              lifespan=lifespan)
 
 
 @app.get("/")
@@ -16,27 +38,35 @@ async def root():
     return {"message": "Welcome to Tool Agent Demo API"}
 
 
-@app.get("/agents", response_model=List[AgentInfo])
-async def get_agents():
-    """List all registered agents"""
-    executors = list_executors()
-    return [
-        {
+def _stream_agents() -> Iterator[bytes]:
+    """Encode registered agents as a JSON array, one agent at a time"""
+    separator = b""
+    yield b"["
+    for executor in iter_executors():
+        yield separator + orjson.dumps({
             "id": executor.id,
             "executor_type": executor.executor_type,
             "executor_path": executor.executor_path,
             "entrypoint_path": executor.entrypoint_path,
             "variable_name": executor.variable_name,
             "agent_info": executor.agent_info
-        }
-        for executor in executors
-    ]
+        })
+        separator = b","
+    yield b"]"
+
+
+@app.get("/agents", response_model=List[AgentInfo])
+async def get_agents():
+    """List all registered agents"""
+    # Rows are read and encoded while the response is sent, in a
+    # worker thread, rather than collected into one list first
+    return StreamingResponse(_stream_agents(), media_type="application/json")
 
 
 @app.post("/agents/{agent_id}/tools/{tool_name}")
 async def call_tool(agent_id: str, tool_name: str, request: ToolRequest):
     """Call an agent's tool"""
-    executor = get_executor(agent_id)
+    executor = get_executor_metadata(agent_id)
     if not executor:
         raise HTTPException(
             status_code=404,
@@ -44,8 +74,7 @@ async def call_tool(agent_id: str, tool_name: str, request: ToolRequest):
         )
 
     # Check if tool exists
-    tools = executor.agent_info.get("tools", [])
-    if not any(t["name"] == tool_name for t in tools):
+    if tool_name not in executor.tool_names:
         raise HTTPException(
             status_code=404,
             detail=f"Tool {tool_name} not found for agent {agent_id}"
@@ -66,7 +95,7 @@ async def call_tool(agent_id: str, tool_name: str, request: ToolRequest):
 @app.post("/agents/{agent_id}/workflows/{workflow_name}")
 async def call_workflow(agent_id: str, workflow_name: str, request: WorkflowRequest):
     """Call an agent's workflow"""
-    executor = get_executor(agent_id)
+    executor = get_executor_metadata(agent_id)
     if not executor:
         raise HTTPException(
             status_code=404,
@@ -74,8 +103,7 @@ async def call_workflow(agent_id: str, workflow_name: str, request: WorkflowRequ
         )
 
     # Check if workflow exists
-    workflows = executor.agent_info.get("workflows", [])
-    if not any(w["name"] == workflow_name for w in workflows):
+    if workflow_name not in executor.workflow_names:
         raise HTTPException(
             status_code=404,
             detail=f"Workflow {workflow_name} not found for agent {agent_id}"
@@ -3,6 +3,8 @@ from functools import wraps, partial
 import ast
 import inspect
 
+import orjson
+
 from tool_agent_demo.core.result import Result
 from tool_agent_demo.serializers.workflow_serializer import WorkflowSerializer, WorkflowGraph
 
@@ -16,28 +18,52 @@ class DeserializationError(Exception):
 
 
 class Agent:
+    # Names of decorated tools and workflows, collected per class
+    _tool_names: tuple = ()
+    _workflow_names: tuple = ()
+    # Transformed workflow functions shared by all instances of a class,
+    # keyed by (qualified name, source)
+    _workflow_code_cache: Dict[tuple, Callable] = {}
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        """Register the tools and workflows of a subclass once, at class creation."""
+        super().__init_subclass__(**kwargs)
+        tool_names = []
+        workflow_names = []
+        for attr_name in dir(cls):
+            # Dunders are never tools or workflows
+            if attr_name.startswith('__'):
+                continue
+            attr = inspect.getattr_static(cls, attr_name)
+            if hasattr(attr, '_is_tool'):
+                tool_names.append(attr_name)
+            elif hasattr(attr, '_is_workflow'):
+                workflow_names.append(attr_name)
+        cls._tool_names = tuple(tool_names)
+        cls._workflow_names = tuple(workflow_names)
+        cls._workflow_code_cache = {}
+
     def __init__(self) -> None:
         """Initialize the Agent with empty tools and workflows collections."""
         self._tools: Dict[str, Callable] = {}
         self._workflows: Dict[str, Callable] = {}
         # Store workflow source code
         self._workflow_sources: Dict[str, str] = {}
-
-        # Automatically collect decorated methods from the instance
-        for attr_name in dir(self):
-            attr = getattr(self, attr_name)
-            if hasattr(attr, '_is_tool'):
-                self._tools[attr_name] = attr
-            elif hasattr(attr, '_is_workflow'):
-                self._workflows[attr_name] = attr
-                # Store source code for workflow methods
-                if hasattr(attr, '__wrapped__'):
-                    source = inspect.getsource(attr.__wrapped__)
-                    source = inspect.cleandoc(source)
-                    source_lines = source.splitlines()
-                    while source_lines[0].lstrip().startswith('@'):
-                        source_lines.pop(0)
-                    self._workflow_sources[attr_name] = '\n'.join(source_lines)
+        # Transformed workflow functions, compiled on first call
+        self._compiled_workflows: Dict[str, Callable] = {}
+
+        # Bind the decorated methods registered for this class
+        for tool_name in self._tool_names:
+            self._tools[tool_name] = getattr(self, tool_name)
+        for workflow_name in self._workflow_names:
+            workflow = getattr(self, workflow_name)
+            self._workflows[workflow_name] = workflow
+            # Store source code for workflow methods, reusing the source
+            # captured when the workflow was decorated
+            if hasattr(workflow, '__wrapped__'):
+                source = getattr(workflow.__wrapped__, '_workflow_source', None)
+                self._workflow_sources[workflow_name] = source or \
+                    Agent._workflow_source_of(workflow.__wrapped__)
 
     def __str__(self) -> str:
         """Custom string representation of the Agent showing tools and workflows."""
@@ -63,10 +89,11 @@ class Agent:
                 if graph:
                     # Display nodes
                     output.append("    Nodes:")
+                    last_node = graph.nodes[-1] if graph.nodes else None
                     for node in graph.nodes:
                         inputs_str = " ".join(p.name for p in node.inputs)
                         # For the last node, show [return] as output
-                        is_last_node = node == graph.nodes[-1]
+                        is_last_node = node is last_node
                         outputs_str = "[return]" if is_last_node else " ".join(
                             p.name for p in node.outputs)
                         output.append(
@@ -74,13 +101,10 @@ class Agent:
 
                     # Display edges
                     output.append("    Edges:")
+                    nodes_by_id = {n.id: n for n in graph.nodes}
                     for edge in graph.edges:
-                        source_parts = edge.source.split(':')
-                        target_parts = edge.target.split(':')
-                        source_node = next(
-                            n for n in graph.nodes if n.id == source_parts[0])
-                        target_node = next(
-                            n for n in graph.nodes if n.id == target_parts[0])
+                        source_node = nodes_by_id[edge.source.partition(':')[0]]
+                        target_node = nodes_by_id[edge.target.partition(':')[0]]
                         output.append(
                             f"      - {source_node.type} -> {target_node.type}")
                 else:
@@ -103,12 +127,15 @@ class Agent:
         def wrapper(self: T, *args: Any, **kwargs: Any) -> Result[Any]:
             try:
                 # 检查参数中是否有Result类型
-                for arg in args:
-                    if isinstance(arg, Result):
-                        if arg.is_err():
-                            return arg
-                        args = (*args[:args.index(arg)],
-                                arg.unwrap(), *args[args.index(arg) + 1:])
+                if any(isinstance(arg, Result) for arg in args):
+                    unwrapped = []
+                    for arg in args:
+                        if isinstance(arg, Result):
+                            if arg.is_err():
+                                return arg
+                            arg = arg.unwrap()
+                        unwrapped.append(arg)
+                    args = tuple(unwrapped)
 
                 for key, value in kwargs.items():
                     if isinstance(value, Result):
@@ -166,12 +193,19 @@ class Agent:
             # First visit any child nodes (this will mark tool calls)
             self.generic_visit(node)
 
-            # If returning a tool call (marked during visit_Call), yield it first
+            # If returning a tool call (marked during visit_Call), yield it first.
+            # The call is bound to a local so the tool only runs once.
             if isinstance(node.value, ast.Call) and hasattr(node.value, '_is_tool_call'):
-                # Create a yield statement
-                yield_stmt = ast.Expr(value=ast.Yield(value=node.value))
-                # Return both statements
-                return [yield_stmt, node]
+                # Create an assignment, a yield and a return of the same value
+                assign_stmt = ast.Assign(
+                    targets=[ast.Name(id='_return_value', ctx=ast.Store())],
+                    value=node.value)
+                yield_stmt = ast.Expr(value=ast.Yield(
+                    value=ast.Name(id='_return_value', ctx=ast.Load())))
+                return_stmt = ast.Return(
+                    value=ast.Name(id='_return_value', ctx=ast.Load()))
+                # Return all three statements
+                return [assign_stmt, yield_stmt, return_stmt]
             return node
 
         def is_tool_call(self, node: ast.Call) -> bool:
@@ -223,19 +257,12 @@ class Agent:
         new_tree = transformer.visit(tree)
         ast.fix_missing_locations(new_tree)
 
-        # Convert back to source
-        transformed_source = ast.unparse(new_tree)
+        # Store the new source and drop the stale compiled version
+        self._workflow_sources[workflow_name] = new_source
+        self._compiled_workflows.pop(workflow_name, None)
 
-        # Store the new source
-        self._workflow_sources[workflow_name] = transformed_source
-
-        # Print debug info
-        print("Generated source code:")
-        print(transformed_source)
-
-        # Compile and execute
-        code = compile(transformed_source,
-                       f"<workflow {workflow_name}>", "exec")
+        # Compile the AST directly and execute
+        code = compile(new_tree, f"<workflow {workflow_name}>", "exec")
         namespace = {}
         exec(code, self._workflows[workflow_name].__globals__, namespace)
         new_func = namespace[workflow_name]
@@ -247,68 +274,144 @@ class Agent:
         self._workflows[workflow_name] = bound_method
 
     @staticmethod
-    def workflow(func: Callable) -> Callable:
+    def _workflow_source_of(func: Callable) -> str:
+        """
+        Get the dedented source of a workflow method without its decorators.
+
+        Args:
+            func: The original, undecorated workflow method.
+
+        Returns:
+            The cleaned source code of the method.
+        """
+        source = inspect.getsource(func)
+        source = inspect.cleandoc(source)
+        source_lines = source.splitlines()
+        while source_lines[0].lstrip().startswith('@'):
+            source_lines.pop(0)
+        return '\n'.join(source_lines)
+
+    @staticmethod
+    def _compile_workflow(agent: 'Agent', func: Callable) -> Callable:
+        """
+        Transform a workflow's source and compile it into a generator function.
+
+        Tool names are fixed when the class is created, so the result is
+        cached on the agent's class and shared by all of its instances.
+
+        Args:
+            agent: The agent whose tools are recognized as tool calls.
+            func: The original, undecorated workflow method.
+
+        Returns:
+            The transformed function, taking self as its first argument.
+        """
+        # Get the source code from the workflow sources if available,
+        # otherwise use the source captured at decoration time
+        if func.__name__ in agent._workflow_sources:
+            source = agent._workflow_sources[func.__name__]
+        else:
+            source = getattr(func, '_workflow_source', None) or \
+                Agent._workflow_source_of(func)
+
+        cache = type(agent)._workflow_code_cache
+        key = (func.__qualname__, source)
+        if key in cache:
+            return cache[key]
+
+        # Parse the source into an AST
+        tree = ast.parse(source)
+
+        # Transform the AST with access to instance tools
+        transformer = Agent.WorkflowTransformer(agent._tools)
+        new_tree = transformer.visit(tree)
+
+        # Fix line numbers
+        ast.fix_missing_locations(new_tree)
+
+        # Compile the AST directly and create a new function from it
+        code = compile(new_tree, f"<workflow {func.__name__}>", "exec")
+        namespace = {}
+        exec(code, func.__globals__, namespace)
+        cache[key] = namespace[func.__name__]
+        return cache[key]
+
+    @staticmethod
+    def last_result(steps: Generator[Any, None, Any]) -> Any:
+        """
+        Drain a workflow generator and return its last yielded value.
+
+        Iteration stops at the first error Result, which is returned.
+
+        Args:
+            steps: The generator returned by a workflow call.
+
+        Returns:
+            The last yielded value, or None if nothing was yielded.
+        """
+        last = None
+        for last in steps:
+            if isinstance(last, Result) and last.is_err():
+                break
+        return last
+
+    @staticmethod
+    def workflow(func: Optional[Callable] = None, *, single: bool = False) -> Callable:
         """
         Decorator to mark a method as a workflow and transform it into a generator
         that yields after each tool call.
 
+        Can be used bare (``@Agent.workflow``) or with options
+        (``@Agent.workflow(single=True)``).
+
         Args:
             func: The method to be marked as a workflow.
+            single: If True, the workflow is drained on call and returns only its
+                final Result (or the first error) instead of a generator.
 
         Returns:
             The decorated method that yields after each tool call.
         """
+        if func is None:
+            return partial(Agent.workflow, single=single)
+
+        # Read the source once, at decoration time. Methods without
+        # retrievable source fall back to reading it on first call.
+        try:
+            func._workflow_source = Agent._workflow_source_of(func)
+        except (OSError, TypeError):
+            func._workflow_source = None
+
         @wraps(func)
         def wrapper(self: T, *args: Any, **kwargs: Any) -> Generator[Any, None, Any]:
-            # Get the source code from the workflow sources if available
-            if hasattr(func, '__name__') and func.__name__ in self._workflow_sources:
-                source = self._workflow_sources[func.__name__]
-            else:
-                # Get from function object for initial decoration
-                source = inspect.getsource(func)
-                source = inspect.cleandoc(source)
-                source_lines = source.splitlines()
-                while source_lines[0].lstrip().startswith('@'):
-                    source_lines.pop(0)
-                source = '\n'.join(source_lines)
-
-            # Parse the source into an AST
-            tree = ast.parse(source)
-
-            # Transform the AST with access to instance tools
-            transformer = Agent.WorkflowTransformer(self._tools)
-            new_tree = transformer.visit(tree)
-
-            # Fix line numbers
-            ast.fix_missing_locations(new_tree)
-
-            # Convert the modified AST back to source code
-            new_source = ast.unparse(new_tree)
-
-            # Create a new function from the modified source
-            namespace = {}
-            exec(new_source, func.__globals__, namespace)
-            new_func = namespace[func.__name__]
+            new_func = self._compiled_workflows.get(func.__name__)
+            if new_func is None:
+                new_func = Agent._compile_workflow(self, func)
+                self._compiled_workflows[func.__name__] = new_func
 
             # Call the transformed function
-            return new_func(self, *args, **kwargs)
+            steps = new_func(self, *args, **kwargs)
+            if single and inspect.isgenerator(steps):
+                return Agent.last_result(steps)
+            return steps
 
         # Mark the method as a workflow
         wrapper._is_workflow = True
         return wrapper
 
-    def to_json(self, file_path: Optional[str] = None) -> str:
+    def to_json(self, file_path: Optional[str] = None, return_str: bool = True) -> Optional[str]:
         """
         Convert Agent's tools and workflows information to JSON format.
 
         Args:
             file_path: Optional path to save the JSON output to a file.
+            return_str: If False, only write the file and skip decoding the
+                JSON into a returned string.
 
         Returns:
-            A JSON string containing the Agent's tools and workflows information.
+            A JSON string containing the Agent's tools and workflows information,
+            or None if return_str is False.
         """
-        import json
-
         data = {
             "tools": {},
             "workflows": {}
@@ -350,10 +453,12 @@ class Agent:
                     }
                 }
 
-        json_str = json.dumps(data, indent=2)
+        json_bytes = orjson.dumps(data, option=orjson.OPT_INDENT_2)
 
         if file_path:
-            with open(file_path, 'w') as f:
-                f.write(json_str)
+            with open(file_path, 'wb') as f:
+                f.write(json_bytes)
 
-        return json_str
+        if not return_str:
+            return None
+        return json_bytes.decode()
@@ -1,7 +1,7 @@
 import json
 import os
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
 import xxhash
 from sqlalchemy import create_engine, Column, String, DateTime, JSON
@@ -156,3 +156,12 @@ def list_executors() -> List[Executor]:
         return session.query(Executor).all()
     finally:
         session.close()
+
+
+def iter_executors(batch_size: int = 100) -> Iterator[Executor]:
+    """Iterate over all registered executors, loading them in batches."""
+    session = Session()
+    try:
+        yield from session.query(Executor).yield_per(batch_size)
+    finally:
+        session.close()
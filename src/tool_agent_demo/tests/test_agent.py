@@ -7,9 +7,10 @@ This module contains tests for:
 3. Tool execution (success and error cases)
 4. Result combination using the | operator
 5. Result handling when used as tool arguments
+6. Single result workflows
 """
 
-from tool_agent_demo import Result
+from tool_agent_demo import Agent, Result
 from tool_agent_demo.tests.test_helpers import TestAgent
 
 
@@ -36,6 +37,30 @@ def test_method_collection():
     assert agent.example_workflow() == "workflow"
 
 
+def test_subclass_registration():
+    """
+    Test that tools and workflows are registered per class, including inherited ones.
+
+    Verifies:
+    - A subclass sees its own and its parent's tools and workflows
+    - Overriding a tool with a plain method unregisters it
+    """
+    class ChildAgent(TestAgent):
+        @Agent.tool
+        def child_tool(self) -> str:
+            return "child"
+
+        def error_tool(self) -> str:
+            return "no longer a tool"
+
+    agent = ChildAgent()
+    assert "child_tool" in agent._tools
+    assert "success_tool" in agent._tools
+    assert "error_tool" not in agent._tools
+    assert "tool_only_workflow" in agent._workflows
+    assert "child_tool" not in TestAgent()._tools
+
+
 def test_tool_only_workflow():
     """
     Test workflow transformation with only tool function calls.
@@ -112,6 +137,64 @@ def test_mixed_workflow():
     assert steps[3].value == "normal-success-test-success"
 
 
+def test_workflow_compiled_once():
+    """
+    Test that a workflow is transformed and compiled only on its first call.
+
+    Verifies:
+    - The compiled function is cached per workflow name
+    - Later calls reuse it and produce the same steps
+    - Instances of the same class share the compiled function
+    """
+    agent = TestAgent()
+    first = [step.value for step in agent.tool_only_workflow()]
+    compiled = agent._compiled_workflows["tool_only_workflow"]
+
+    second = [step.value for step in agent.tool_only_workflow()]
+    assert agent._compiled_workflows["tool_only_workflow"] is compiled
+    assert first == second
+
+    # Other instances of the class reuse the same compiled function
+    other = TestAgent()
+    assert [step.value for step in other.tool_only_workflow()] == first
+    assert other._compiled_workflows["tool_only_workflow"] is compiled
+
+
+def test_returned_tool_call_runs_once():
+    """
+    Test that a workflow returning a tool call executes the tool only once.
+
+    Verifies:
+    - The returned tool call is yielded
+    - Draining the workflow does not call the tool again
+    """
+    agent = TestAgent()
+    steps = list(agent.counting_workflow())
+
+    assert [step.value for step in steps] == [1]
+    assert agent.call_count == 1
+
+
+def test_single_result_workflow():
+    """
+    Test workflows decorated with single=True.
+
+    Verifies:
+    - The call returns the final Result instead of a generator
+    - The first error Result is returned and later steps are skipped
+    """
+    agent = TestAgent()
+
+    result = agent.single_workflow()
+    assert isinstance(result, Result)
+    assert result.value == "success-test-done"
+
+    failed = agent.failing_single_workflow()
+    assert isinstance(failed, Result)
+    assert failed.is_err()
+    assert isinstance(failed.error, ValueError)
+
+
 def test_tool_execution():
     """
     Test tool execution in both success and error scenarios.
@@ -259,5 +342,10 @@ def test_to_json():
             file_data = json.load(f)
             assert file_data == data
 
+        # Writing without building the returned string
+        assert agent.to_json(file_path=tmp.name, return_str=False) is None
+        with open(tmp.name) as f:
+            assert json.load(f) == data
+
         # Clean up
         os.unlink(tmp.name)
@@ -3,9 +3,11 @@ from fastapi.testclient import TestClient
 from pathlib import Path
 import sys
 import os
+from datetime import datetime
 
 from tool_agent_demo.api.routes import app
-from tool_agent_demo.api.executor import executors, AsyncExecutor
+from tool_agent_demo.api.executor import (
+    executors, AsyncExecutor, warm_up_executors, shutdown_executors)
 from tool_agent_demo.core.db import list_executors, get_executor
 
 # Set Jupyter platform dirs
@@ -28,6 +30,7 @@ class MockExecutor:
             "tools": [{"name": "test_tool"}],
             "workflows": [{"name": "test_workflow"}]
         }
+        self.updated_at = datetime(2025, 1, 1)
 
 
 @pytest.fixture
@@ -38,13 +41,14 @@ def mock_executor(monkeypatch):
     def mock_get_executor(id):
         return executor if id == "test-agent" else None
 
-    def mock_list_executors():
+    def mock_iter_executors():
         return [executor]
 
     monkeypatch.setattr(
-        "tool_agent_demo.api.routes.get_executor", mock_get_executor)
+        "tool_agent_demo.api.executor.get_executor", mock_get_executor)
+    monkeypatch.setattr("tool_agent_demo.api.executor._metadata_cache", {})
     monkeypatch.setattr(
-        "tool_agent_demo.api.routes.list_executors", mock_list_executors)
+        "tool_agent_demo.api.routes.iter_executors", mock_iter_executors)
 
     return executor
 
@@ -157,3 +161,38 @@ async def test_invalid_kernel_operations():
     response = client.post("/agents/kernel/invalid-kernel/cancel")
     assert response.status_code == 404
     assert "not found" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_warm_up_executors(mock_executor, monkeypatch):
+    """Test that registered agents get a running kernel at startup"""
+    monkeypatch.setattr(
+        "tool_agent_demo.api.executor.list_executors", lambda: [mock_executor])
+    monkeypatch.delitem(executors, "test-agent", raising=False)
+
+    await warm_up_executors()
+    wrapper = executors["test-agent"]
+    assert wrapper.initialized
+
+    await shutdown_executors()
+    assert not wrapper.initialized
+
+
+@pytest.mark.asyncio
+async def test_executor_metadata_cached(mock_executor, monkeypatch):
+    """Test that executor lookups are served from the metadata cache"""
+    calls = []
+
+    def counting_get_executor(id):
+        calls.append(id)
+        return mock_executor
+
+    monkeypatch.setattr(
+        "tool_agent_demo.api.executor.get_executor", counting_get_executor)
+
+    for _ in range(2):
+        response = client.post(
+            "/agents/test-agent/tools/missing_tool", json={})
+        assert response.status_code == 404
+        assert "Tool missing_tool not found" in response.json()["detail"]
+    assert calls == ["test-agent"]
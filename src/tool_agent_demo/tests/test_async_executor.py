@@ -47,13 +47,15 @@ def create_test_agent():
 
 
 @pytest.fixture
-def executor():
+async def executor():
     # Use current Python executable for testing
     executor = AsyncExecutor("env", str(Path(sys.executable).parent.parent))
     yield executor
     # Cleanup
     if executor.km:
-        executor.km.shutdown_kernel(now=True)
+        executor.kc.stop_channels()
+        await executor.km.shutdown_kernel(now=True)
+        executor.km = None
 
 
 @pytest.mark.asyncio
@@ -106,6 +108,91 @@ class TestAgent:
     assert result == {"result": "Success: Hello"}
 
 
+@pytest.mark.asyncio
+async def test_execute_reuses_kernel(executor, tmp_path):
+    """Test that consecutive calls are dispatched to the same kernel"""
+    # Create test module file
+    module_path = tmp_path / "test_module.py"
+    with open(module_path, "w") as f:
+        f.write("""
+from tool_agent_demo.core.result import Result, Ok, Err
+
+class TestAgent:
+    def __init__(self):
+        self._tools = {"test": self.test_tool}
+
+    def test_tool(self, msg: str) -> Result[str]:
+        return Ok(f"Success: {msg}")
+""")
+
+    result = await executor.execute(
+        str(module_path.with_suffix("")), "TestAgent", "tools", "test", ["a"], {})
+    assert result == {"result": "Success: a"}
+    km = executor.km
+
+    # Quotes and backslashes in arguments must not break the call
+    msg = "b ''' \"\"\" \\n"
+    result = await executor.execute(
+        str(module_path.with_suffix("")), "TestAgent", "tools", "test", [msg], {})
+    assert result == {"result": f"Success: {msg}"}
+    assert executor.km is km
+
+
+@pytest.mark.asyncio
+async def test_concurrent_execute(executor, tmp_path):
+    """Test that concurrent calls each get their own output"""
+    # Create test module file
+    module_path = tmp_path / "test_module.py"
+    with open(module_path, "w") as f:
+        f.write("""
+from tool_agent_demo.core.result import Result, Ok, Err
+
+class TestAgent:
+    def __init__(self):
+        self._tools = {"test": self.test_tool}
+
+    def test_tool(self, msg: str) -> Result[str]:
+        return Ok(f"Success: {msg}")
+""")
+
+    results = await asyncio.gather(*(
+        executor.execute(
+            str(module_path.with_suffix("")), "TestAgent", "tools", "test", [str(i)], {})
+        for i in range(5)
+    ))
+    assert results == [{"result": f"Success: {i}"} for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_agent_loaded_once(executor, tmp_path):
+    """Test that the kernel keeps the agent until its module changes"""
+    # Create test module file
+    module_path = tmp_path / "test_module.py"
+    with open(module_path, "w") as f:
+        f.write("""
+class TestAgent:
+    def __init__(self):
+        self._tools = {"count": self.count_tool}
+        self.calls = 0
+
+    def count_tool(self) -> int:
+        self.calls += 1
+        return self.calls
+""")
+
+    async def count():
+        return await executor.execute(
+            str(module_path.with_suffix("")), "TestAgent", "tools", "count", [], {})
+
+    assert await count() == {"result": 1}
+    assert await count() == {"result": 2}
+
+    # A modified module is loaded again
+    stat = module_path.stat()
+    os.utime(module_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert await count() == {"result": 1}
+
+
 @pytest.mark.asyncio
 async def test_execute_tool_error(executor, tmp_path):
     """Test tool execution with error"""
@@ -16,6 +16,11 @@ class TestAgent(Agent):  # This is a helper class, not a test class
     def concat_tool(self, a: str, b: str) -> str:
         return f"{a}-{b}"
 
+    @Agent.tool
+    def count_tool(self) -> int:
+        self.call_count = getattr(self, "call_count", 0) + 1
+        return self.call_count
+
     @Agent.workflow
     def example_workflow(self) -> str:
         return "workflow"
@@ -42,3 +47,21 @@ class TestAgent(Agent):  # This is a helper class, not a test class
         b = self.normal_function(b)
         c = self.success_tool() | self.success_tool()
         return self.concat_tool(b, c.unwrap()[0])
+
+    @Agent.workflow
+    def counting_workflow(self) -> int:
+        """Workflow that returns a tool call directly."""
+        return self.count_tool()
+
+    @Agent.workflow(single=True)
+    def single_workflow(self) -> str:
+        """Workflow that returns only its final Result."""
+        a = self.success_tool()
+        b = self.concat_tool(a, "test")
+        return self.concat_tool(b, "done")
+
+    @Agent.workflow(single=True)
+    def failing_single_workflow(self) -> str:
+        """Single result workflow that fails on its first step."""
+        a = self.error_tool()
+        return self.concat_tool(a, "test")